@@ -3,25 +3,39 @@ from datetime import datetime
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.future import select
-from sqlalchemy import update, delete
+from sqlalchemy import update, delete, bindparam, event
 from sqlalchemy.pool import NullPool
 
 from config import load_config
-from database.models import Base, User, Product, Category, Purchase, Newsletter
+from database.models import Base, User, Product, Category, Purchase, Newsletter, PendingPayment
 
 # Load config for database URL
 config = load_config()
 DATABASE_URL = config.database_url
 
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
 # Create async engine with optimized settings
-# Using NullPool to prevent connection pooling issues in asyncio applications
+# SQLite connections are kept in the default pool so the pragmas below are set
+# once per connection; other backends use NullPool to avoid connection issues
 engine = create_async_engine(
     DATABASE_URL, 
     echo=False,  # Set to False to reduce logging overhead
-    poolclass=NullPool,  # Use NullPool to avoid connection issues
+    poolclass=None if IS_SQLITE else NullPool,
     future=True
 )
 
+if IS_SQLITE:
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Use WAL and a larger page cache so the bot and the webhook don't block each other"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-64000")
+        cursor.close()
+
 # Create async session factory
 async_session = sessionmaker(
     engine, expire_on_commit=False, class_=AsyncSession
@@ -125,30 +139,105 @@ async def update_user_balance(telegram_id: int, new_balance: float) -> bool:
         logger.error(f"Error updating user balance: {e}")
         return False
 
-async def add_user_balance(telegram_id: int, amount: float) -> tuple:
-    """Add amount to user balance and return success status with old and new balance"""
+# Balance top-up statement, built once; SQLAlchemy's compiled cache and the
+# driver's statement cache then reuse it on every call
+_ADD_BALANCE_STMT = (
+    update(User)
+    .where(User.telegram_id == bindparam("b_telegram_id"))
+    .values(balance=User.balance + bindparam("b_amount"), last_active=bindparam("b_now"))
+    # RETURNING sees the updated row, so the old balance is balance - amount
+    .returning(User.balance - bindparam("b_amount"), User.balance)
+)
+
+async def _add_balance(session: AsyncSession, telegram_id: int, amount: float):
+    """Run the balance top-up in the given session, returns (old, new) or None if the user is missing"""
+    # Increment in a single statement so concurrent top-ups can't overwrite each other
+    result = await session.execute(
+        _ADD_BALANCE_STMT,
+        {"b_telegram_id": telegram_id, "b_amount": amount, "b_now": datetime.utcnow()}
+    )
+    row = result.first()
+    if row is None:
+        return None
+    # The old balance is derived as new - amount, round off the float error
+    # so fractional balances read like the stored value (10.3, not 10.300000000000011)
+    return round(float(row[0]), 2), float(row[1])
+
+async def add_pending_payment(telegram_id: int, coin_amount: int, amount_crypto: str, currency: str) -> int:
+    """Store an acknowledged payment before it is credited, returns its id or None on error"""
     try:
         async with async_session() as session:
-            query = select(User).where(User.telegram_id == telegram_id)
-            result = await session.execute(query)
-            user = result.scalars().first()
+            payment = PendingPayment(
+                telegram_id=telegram_id,
+                coin_amount=coin_amount,
+                amount_crypto=str(amount_crypto),
+                currency=currency
+            )
+            session.add(payment)
+            await session.commit()
+            return payment.id
+    except Exception as e:
+        logger.error("Error storing pending payment: %s", e)
+        return None
+
+async def credit_pending_payment(payment_id: int, telegram_id: int, amount: float) -> tuple:
+    """Credit a stored payment and delete it in one transaction, returns success (None if it was already credited) with old and new balance"""
+    try:
+        async with async_session() as session:
+            # Claim the row first, only the transaction that deletes it may credit it
+            result = await session.execute(
+                delete(PendingPayment).where(PendingPayment.id == payment_id).returning(PendingPayment.id)
+            )
+            if result.first() is None:
+                logger.info("Pending payment %s was already credited", payment_id)
+                return None, 0, 0
             
-            if not user:
-                logger.error(f"User {telegram_id} not found in database")
-                return False, 0, 0
+            row = await _add_balance(session, telegram_id, amount)
             
-            current_balance = user.balance
-            new_balance = current_balance + amount
-            user.balance = new_balance
-            user.last_active = datetime.utcnow()
+            if row is None:
+                # Leaving without commit rolls the delete back, so the payment stays stored
+                logger.error("User %s not found in database", telegram_id)
+                return False, 0, 0
             
+            current_balance, new_balance = row
             await session.commit()
-            logger.info(f"Updated balance for user {telegram_id}: {current_balance} -> {new_balance}")
+            logger.info("Updated balance for user %s: %s -> %s", telegram_id, current_balance, new_balance)
             return True, current_balance, new_balance
     except Exception as e:
-        logger.error(f"Error adding user balance: {e}")
+        logger.error("Error crediting pending payment %s: %s", payment_id, e)
         return False, 0, 0
 
+async def mark_pending_payment_failed(payment_id: int) -> int:
+    """Count a failed credit attempt, returns the new attempt count or None on error"""
+    try:
+        async with async_session() as session:
+            result = await session.execute(
+                update(PendingPayment)
+                .where(PendingPayment.id == payment_id)
+                .values(attempts=PendingPayment.attempts + 1)
+                .returning(PendingPayment.attempts)
+            )
+            attempts = result.scalar()
+            await session.commit()
+            return attempts
+    except Exception as e:
+        logger.error("Error updating pending payment %s: %s", payment_id, e)
+        return None
+
+async def get_pending_payments(max_attempts: int) -> list:
+    """Get stored payments that still have credit attempts left, oldest first"""
+    try:
+        async with async_session() as session:
+            result = await session.execute(
+                select(PendingPayment)
+                .where(PendingPayment.attempts < max_attempts)
+                .order_by(PendingPayment.id)
+            )
+            return result.scalars().all()
+    except Exception as e:
+        logger.error("Error getting pending payments: %s", e)
+        return []
+
 async def get_user_by_username(username: str) -> User:
     """Get user by username"""
     try:
@@ -179,6 +268,27 @@ async def get_all_products(available_only: bool = True):
         logger.error(f"Error getting products: {e}")
         return []
 
+async def get_products_page(category_id: int, offset: int, limit: int, available_only: bool = True) -> tuple:
+    """Get one page of products and the total count, category_id 0 means all products"""
+    try:
+        async with async_session() as session:
+            from sqlalchemy import func
+            conditions = []
+            if category_id:
+                conditions.append(Product.category_id == category_id)
+            if available_only:
+                conditions.append(Product.available == True)
+            
+            count_query = select(func.count(Product.id)).where(*conditions)
+            total = (await session.execute(count_query)).scalar_one()
+            
+            query = select(Product).where(*conditions).order_by(Product.id).offset(offset).limit(limit)
+            result = await session.execute(query)
+            return result.scalars().all(), total
+    except Exception as e:
+        logger.error(f"Error getting products page: {e}")
+        return [], 0
+
 async def get_product(product_id: int):
     """Get product by ID with category eagerly loaded"""
     try:
@@ -1,4 +1,5 @@
 from datetime import datetime
+from functools import cached_property
 from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, BigInteger, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -52,6 +53,11 @@ class Product(Base):
     # Relationships
     category = relationship("Category", back_populates="products")
     purchases = relationship("Purchase", back_populates="product")
+
+    @cached_property
+    def display_price(self) -> str:
+        """Price formatted with two decimals, computed once per loaded instance"""
+        return f"{self.price:.2f}"
     
     def __repr__(self):
         return f"<Product(id={self.id}, title={self.title}, price={self.price})>"
@@ -97,4 +103,20 @@ class Newsletter(Base):
     creator = relationship("User", back_populates="newsletters")
 
     def __repr__(self):
-        return f"<Newsletter(id={self.id}, title={self.title}, status={self.status})>"
\ No newline at end of file
+        return f"<Newsletter(id={self.id}, title={self.title}, status={self.status})>"
+
+
+class PendingPayment(Base):
+    """Acknowledged webhook payment that has not been credited yet, deleted once it is"""
+    __tablename__ = 'pending_payments'
+
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(BigInteger, nullable=False)
+    coin_amount = Column(Integer, nullable=False)
+    amount_crypto = Column(String(50), nullable=True)
+    currency = Column(String(20), nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<PendingPayment(id={self.id}, telegram_id={self.telegram_id}, coin_amount={self.coin_amount})>"
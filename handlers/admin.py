@@ -4,7 +4,7 @@ from aiogram.types import Message, CallbackQuery, FSInputFile
 from aiogram.utils.markdown import hbold, hcode
 from aiogram.fsm.context import FSMContext
 import os
-import shutil
+import sqlite3
 from datetime import datetime
 import logging
 
@@ -36,7 +36,7 @@ from utils.admin import is_admin
 
 # Load config to get admin IDs
 config = load_config()
-ADMIN_IDS = config.admin_ids
+ADMIN_IDS = frozenset(config.admin_ids)
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -110,7 +110,7 @@ async def admin_product_actions(callback: CallbackQuery):
     product_text = (
         f"📦 {hbold(product.title)}\n\n"
         f"Description: {product.short_description}\n"
-        f"Price: {hcode(f'{product.price:.2f}')} coins\n"
+        f"Price: {hcode(product.display_price)} coins\n"
         f"Available: {'✅' if product.available else '❌'}\n"
         f"Category: {category_name}\n"
         f"File ID: {product.file_id or 'Not set'}\n"
@@ -875,8 +875,15 @@ async def admin_download_backup(callback: CallbackQuery):
         backup_filename = f"backup_{timestamp}.sqlite3"
         backup_path = os.path.join('backups', backup_filename)
         
-        # Copy the database file
-        shutil.copy2(db_path, backup_path)
+        # Copy the database through SQLite's online backup API so commits
+        # still sitting in the WAL file end up in the backup too
+        source = sqlite3.connect(db_path)
+        target = sqlite3.connect(backup_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
         
         # Send file to admin
         await callback.message.answer("Database backup created successfully! Sending file...")
@@ -4,7 +4,7 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.utils.markdown import hbold, hcode
 import math
 
-from database.methods import get_all_categories, get_products_by_category, get_all_products, get_product
+from database.methods import get_all_categories, get_products_page, get_product
 from keyboards.keyboards import (
     get_categories_keyboard,
     get_products_keyboard,
@@ -12,18 +12,32 @@ from keyboards.keyboards import (
     get_main_keyboard,
     get_paginated_products_keyboard
 )
+from keyboards.callbacks import ProductCB, PaginationCB
 
 # Set the number of products per page
 PRODUCTS_PER_PAGE = 3
 
 
+async def load_products_page(category_id: int, page: int):
+    """Fetch one catalog page from the database, returns (products, page, total_pages)"""
+    products, total = await get_products_page(category_id, page * PRODUCTS_PER_PAGE, PRODUCTS_PER_PAGE)
+    total_pages = max(1, math.ceil(total / PRODUCTS_PER_PAGE))
+
+    # The catalog may have shrunk since the keyboard was sent, fall back to the last page
+    if not products and total and page >= total_pages:
+        page = total_pages - 1
+        products, total = await get_products_page(category_id, page * PRODUCTS_PER_PAGE, PRODUCTS_PER_PAGE)
+
+    return products, page, total_pages
+
+
 async def cmd_catalog(message: Message):
     """Handle /catalog command"""
     # Get all categories
     categories = await get_all_categories()
 
-    # Get all products to check if there are any
-    products = await get_all_products()
+    # Get the first page of products, this also tells us if there are any
+    products, page, total_pages = await load_products_page(0, 0)
 
     if not products:
         await message.answer(
@@ -36,7 +50,7 @@ async def cmd_catalog(message: Message):
     if not categories:
         await message.answer(
             "📚 У нас есть несколько товаров в наличии:",
-            reply_markup=get_paginated_products_keyboard(products, 0, PRODUCTS_PER_PAGE)
+            reply_markup=get_paginated_products_keyboard(products, page, total_pages)
         )
         return
 
@@ -52,8 +66,8 @@ async def show_category(callback: CallbackQuery):
     # Extract category ID from callback data (category:123)
     category_id = int(callback.data.split(':')[1])
 
-    # Get products in category
-    products = await get_products_by_category(category_id)
+    # Get the first page of products in category
+    products, page, total_pages = await load_products_page(category_id, 0)
 
     if not products:
         await callback.message.answer(
@@ -66,15 +80,15 @@ async def show_category(callback: CallbackQuery):
     # Show products keyboard with pagination
     await callback.message.answer(
         "🛍 Доступные товары:",
-        reply_markup=get_paginated_products_keyboard(products, 0, PRODUCTS_PER_PAGE)
+        reply_markup=get_paginated_products_keyboard(products, page, total_pages, category_id)
     )
     await callback.answer()
 
 
 async def show_all_products(callback: CallbackQuery):
     """Show all available products"""
-    # Get all products
-    products = await get_all_products()
+    # Get the first page of all products
+    products, page, total_pages = await load_products_page(0, 0)
 
     if not products:
         await callback.message.answer(
@@ -87,25 +101,22 @@ async def show_all_products(callback: CallbackQuery):
     # Show products keyboard with pagination
     await callback.message.answer(
         "🛍 Все доступные товары:",
-        reply_markup=get_paginated_products_keyboard(products, 0, PRODUCTS_PER_PAGE)
+        reply_markup=get_paginated_products_keyboard(products, page, total_pages)
     )
     await callback.answer()
 
 
-async def paginate_products(callback: CallbackQuery):
+async def paginate_products(callback: CallbackQuery, callback_data: PaginationCB):
     """Handle pagination of products"""
-    # Parse the callback data (pagination:category_id:page)
     # If category_id is 0, it means "all products"
-    parts = callback.data.split(':')
-    category_id = int(parts[1])
-    page = int(parts[2])
+    category_id = callback_data.category_id
+    page = callback_data.page
 
-    # Get products based on category_id
+    # Get the requested page of products based on category_id
+    products, page, total_pages = await load_products_page(category_id, page)
     if category_id == 0:
-        products = await get_all_products()
         title = "🛍 Все доступные товары:"
     else:
-        products = await get_products_by_category(category_id)
         title = "🛍 Товары в категории:"
 
     if not products:
@@ -119,15 +130,14 @@ async def paginate_products(callback: CallbackQuery):
     # Show products with updated pagination
     await callback.message.edit_text(
         title,
-        reply_markup=get_paginated_products_keyboard(products, page, PRODUCTS_PER_PAGE)
+        reply_markup=get_paginated_products_keyboard(products, page, total_pages, category_id)
     )
     await callback.answer()
 
 
-async def show_product_details(callback: CallbackQuery):
+async def show_product_details(callback: CallbackQuery, callback_data: ProductCB):
     """Show details for a product"""
-    # Extract product ID from callback data (product:123)
-    product_id = int(callback.data.split(':')[1])
+    product_id = callback_data.id
 
     # Get product details
     product = await get_product(product_id)
@@ -140,7 +150,7 @@ async def show_product_details(callback: CallbackQuery):
     product_text = (
         f"📦 {hbold(product.title)}\n\n"
         f"{product.short_description}\n\n"
-        f"Цена: {hcode(f'{product.price:.2f}')} монет"
+        f"Цена: {hcode(product.display_price)} монет"
     )
 
     # If product has a preview image, show it with the details
@@ -188,6 +198,6 @@ def register_catalog_handlers(dp: Dispatcher):
     dp.message.register(cmd_catalog, F.text == "📚 Каталог")
     dp.callback_query.register(show_category, F.data.startswith("category:"))
     dp.callback_query.register(show_all_products, F.data == "all_products")
-    dp.callback_query.register(paginate_products, F.data.startswith("pagination:"))
-    dp.callback_query.register(show_product_details, F.data.startswith("product:"))
+    dp.callback_query.register(paginate_products, PaginationCB.filter())
+    dp.callback_query.register(show_product_details, ProductCB.filter())
     dp.callback_query.register(back_to_products, F.data == "back_to_products")
\ No newline at end of file
@@ -37,7 +37,7 @@ from utils.admin import is_admin
 
 # Load config to get admin IDs
 config = load_config()
-ADMIN_IDS = config.admin_ids
+ADMIN_IDS = frozenset(config.admin_ids)
 
 # Configure logging
 logger = logging.getLogger(__name__)
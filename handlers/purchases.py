@@ -37,7 +37,7 @@ async def buy_product(callback: CallbackQuery, state: FSMContext):
     confirmation_text = (
         f"🛒 {hbold('Подтверждение покупки')}\n\n"
         f"Товар: {hbold(product.title)}\n"
-        f"Цена: {hcode(f'{product.price:.2f}')} монет\n"
+        f"Цена: {hcode(product.display_price)} монет\n"
         f"Ваш баланс: {hcode(f'{balance:.2f}')} монет\n\n"
         f"После покупки: {hcode(f'{balance - product.price:.2f}')} монет\n\n"
         f"Хотите продолжить покупку?"
@@ -17,7 +17,7 @@ from keyboards.keyboards import get_admin_keyboard
 
 # Load config to get admin IDs
 config = load_config()
-ADMIN_IDS = config.admin_ids
+ADMIN_IDS = frozenset(config.admin_ids)
 
 async def is_admin(user_id: int) -> bool:
     """Check if user is admin"""
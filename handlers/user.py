@@ -13,7 +13,7 @@ from handlers.admin import cmd_admin
 
 # Load config to get admin IDs and contact
 config = load_config()
-ADMIN_IDS = config.admin_ids
+ADMIN_IDS = frozenset(config.admin_ids)
 ADMIN_CONTACT = config.admin_contact
 
 
@@ -0,0 +1,13 @@
+from aiogram.filters.callback_data import CallbackData
+
+class ProductCB(CallbackData, prefix="product"):
+    """Open product details (product:123)"""
+    id: int
+
+class PaginationCB(CallbackData, prefix="pagination"):
+    """Switch products page (pagination:category_id:page), category 0 means all products"""
+    category_id: int
+    page: int
+
+# Packed prefix for building product callbacks by plain concatenation in hot loops
+PRODUCT_CB_PREFIX = ProductCB.__prefix__ + ProductCB.__separator__
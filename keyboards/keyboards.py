@@ -1,89 +1,144 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-import math
+import sys
+from functools import lru_cache
+from itertools import islice
 from config import load_config
-
-# Load config to get admin IDs
-config = load_config()
-ADMIN_IDS = config.admin_ids
+from keyboards.callbacks import PaginationCB, PRODUCT_CB_PREFIX
+
+# Rows and prebuilt markups in this module are shared between calls and between
+# keyboards: markups built with model_construct hold the very same row lists.
+# Never mutate a row or a returned markup in place; build a new list instead.
+
+# Admin IDs, loaded from config on first use instead of at import
+_admin_ids: frozenset[int] | None = None
+
+
+def _get_admin_ids() -> frozenset[int]:
+    """Get admin IDs, loading them from config once per process"""
+    global _admin_ids
+    if _admin_ids is None:
+        _admin_ids = frozenset(load_config().admin_ids)
+    return _admin_ids
+
+
+def __getattr__(name):
+    """Keep keyboards.ADMIN_IDS available as a lazily loaded attribute"""
+    if name == "ADMIN_IDS":
+        return _get_admin_ids()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Most products get_products_keyboard lists without pagination; the paginated
+# catalog pages by PRODUCTS_PER_PAGE in handlers/catalog.py
+PRODUCTS_KEYBOARD_LIMIT = 10
+
+# Identical rows are interned here so every keyboard that uses, say, the
+# "Back to main menu" row shares one list and one validated button
+_ROWS = {}
+
+
+def _row(text: str, **kwargs) -> list:
+    """Get the shared single-button row for these button fields, building it once"""
+    key = (text, tuple(sorted(kwargs.items())))
+    row = _ROWS.get(key)
+    if row is None:
+        row = _ROWS[key] = [InlineKeyboardButton(text=text, **kwargs)]
+    return row
+
+
+# Fixed rows shared by the dynamic keyboards, appended by reference
+_BACK_TO_CATEGORIES_ROW = _row("Назад к категориям", callback_data="back_to_categories")
+_BACK_TO_MENU_ROW = _row("Назад в меню", callback_data="back_to_menu")
+_ALL_PRODUCTS_ROW = _row("Все товары", callback_data="all_products")
+_ADD_NEW_PRODUCT_ROW = _row("➕ Добавить новый товар", callback_data="admin_add_product")
+_BACK_TO_ADMIN_ROW = _row("↩️ Назад в панель администратора", callback_data="admin_back")
+_SKIP_CATEGORY_ROW = _row("Пропустить (оставить текущую)", callback_data="admin_category:skip")
+_BACK_NEWSLETTER_ROW = _row("↩️ Назад", callback_data="admin_newsletter")
+_BACK_TO_MAIN_MENU_ROW = _row("↩️ Назад в главное меню", callback_data="back_to_menu")
+
+_ADMIN_PRODUCTS_TRAILER = [_ADD_NEW_PRODUCT_ROW, _BACK_TO_ADMIN_ROW]
+_CATEGORIES_TRAILER = [_ALL_PRODUCTS_ROW, _BACK_TO_MENU_ROW]
+
+
+@lru_cache(maxsize=1024)
+def _product_label(title: str, price: float) -> str:
+    """Format product button text, cached per (title, price)"""
+    return f"{title} - {price:.2f} монет"
+
+
+@lru_cache(maxsize=1024)
+def _admin_product_label(available: bool, title: str, price: float) -> str:
+    """Format admin product button text with its availability mark, cached"""
+    return f"{'✅' if available else '❌'} {_product_label(title, price)}"
+
+
+# Markups that never change are built once at import and shared between calls.
+# Their rows come from _row and are already validated, so the markups
+# themselves skip validation.
+_MAIN_KB_ROWS = (
+    (
+        KeyboardButton(text="📚 Каталог"),
+        KeyboardButton(text="💰 Баланс"),
+    ),
+    (
+        KeyboardButton(text="👤 Профиль"),
+        KeyboardButton(text="📞 Поддержка"),
+    ),
+)
+_MAIN_KB_USER = ReplyKeyboardMarkup(
+    keyboard=_MAIN_KB_ROWS,
+    resize_keyboard=True,
+    input_field_placeholder="Выберите опцию"
+)
+_MAIN_KB_ADMIN = ReplyKeyboardMarkup(
+    keyboard=_MAIN_KB_ROWS + ((KeyboardButton(text="👑 Панель администратора"),),),
+    resize_keyboard=True,
+    input_field_placeholder="Выберите опцию"
+)
 
 
 def get_main_keyboard(user_id=None) -> ReplyKeyboardMarkup:
     """Get main menu keyboard, with admin button if user is admin"""
-    buttons = [
-        [
-            KeyboardButton(text="📚 Каталог"),
-            KeyboardButton(text="💰 Баланс"),
-        ],
-        [
-            KeyboardButton(text="👤 Профиль"),
-            KeyboardButton(text="📞 Поддержка")
-        ]
-    ]
+    return _MAIN_KB_ADMIN if user_id in _get_admin_ids() else _MAIN_KB_USER
 
-    # Add admin button if user is admin
-    if user_id in ADMIN_IDS:
-        buttons.append([KeyboardButton(text="👑 Панель администратора")])
 
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        input_field_placeholder="Выберите опцию"
-    )
-    return keyboard
+_ADMIN_KB = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        _row("🏪 Управление товарами", callback_data="admin_manage_products"),
+        _row("🆕 Добавить товар", callback_data="admin_add_product"),
+        _row("💰 Добавить баланс пользователю", callback_data="admin_add_balance"),
+        _row("📊 Статистика", callback_data="admin_statistics"),
+        _row("📨 Рассылка", callback_data="admin_newsletter"),
+        _row("↩️ Назад в главное меню", callback_data="back_to_menu")
+    ]
+)
 
 
 def get_admin_keyboard() -> InlineKeyboardMarkup:
     """Get admin panel keyboard (Updated with Newsletter button)"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="🏪 Управление товарами", callback_data="admin_manage_products")
-            ],
-            [
-                InlineKeyboardButton(text="🆕 Добавить товар", callback_data="admin_add_product")
-            ],
-            [
-                InlineKeyboardButton(text="💰 Добавить баланс пользователю", callback_data="admin_add_balance")
-            ],
-            [
-                InlineKeyboardButton(text="📊 Статистика", callback_data="admin_statistics")
-            ],
-            [
-                InlineKeyboardButton(text="📨 Рассылка", callback_data="admin_newsletter")
-            ],
-            [
-                InlineKeyboardButton(text="↩️ Назад в главное меню", callback_data="back_to_menu")
-            ]
-        ]
-    )
-    return keyboard
+    return _ADMIN_KB
 
 
 def get_admin_products_keyboard(products) -> InlineKeyboardMarkup:
     """Get admin products management keyboard"""
-    buttons = []
+    IKB = InlineKeyboardButton.model_construct  # local alias for the button loop
+    prefix = "admin_product:"
 
-    # Add product buttons
-    for product in products:
-        status = "✅" if product.available else "❌"
-        buttons.append([
-            InlineKeyboardButton(
-                text=f"{status} {product.title} - {product.price:.2f} монет",
-                callback_data=f"admin_product:{product.id}"
+    # Add product buttons, followed by the fixed navigation rows
+    rows = [
+        [
+            IKB(
+                text=_admin_product_label(product.available, product.title, product.price),
+                callback_data=sys.intern(prefix + str(product.id))
             )
-        ])
-
-    # Add navigation buttons
-    buttons.append([
-        InlineKeyboardButton(text="➕ Добавить новый товар", callback_data="admin_add_product")
-    ])
-    buttons.append([
-        InlineKeyboardButton(text="↩️ Назад в панель администратора", callback_data="admin_back")
-    ])
+        ]
+        for product in products
+    ]
 
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=rows + _ADMIN_PRODUCTS_TRAILER)
 
 
+@lru_cache(maxsize=1024)
 def get_admin_product_actions_keyboard(product_id) -> InlineKeyboardMarkup:
     """Get keyboard with actions for a specific product"""
     keyboard = InlineKeyboardMarkup(
@@ -100,12 +155,7 @@ def get_admin_product_actions_keyboard(product_id) -> InlineKeyboardMarkup:
                     callback_data=f"admin_delete_product:{product_id}"
                 )
             ],
-            [
-                InlineKeyboardButton(
-                    text="↩️ Назад к товарам",
-                    callback_data="admin_manage_products"
-                )
-            ]
+            _row("↩️ Назад к товарам", callback_data="admin_manage_products")
         ]
     )
     return keyboard
@@ -113,12 +163,13 @@ def get_admin_product_actions_keyboard(product_id) -> InlineKeyboardMarkup:
 
 def get_admin_categories_keyboard(categories, include_skip=False) -> InlineKeyboardMarkup:
     """Get categories keyboard for admin product management"""
+    IKB = InlineKeyboardButton.model_construct  # local alias for the button loop
     buttons = []
 
     # Add category buttons
     for category in categories:
         buttons.append([
-            InlineKeyboardButton(
+            IKB(
                 text=category.name,
                 callback_data=f"admin_category:{category.id}"
             )
@@ -126,16 +177,12 @@ def get_admin_categories_keyboard(categories, include_skip=False) -> InlineKeybo
 
     # Add skip button if needed
     if include_skip:
-        buttons.append([
-            InlineKeyboardButton(
-                text="Пропустить (оставить текущую)",
-                callback_data="admin_category:skip"
-            )
-        ])
+        buttons.append(_SKIP_CATEGORY_ROW)
 
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=1024)
 def get_admin_confirm_delete_keyboard(product_id) -> InlineKeyboardMarkup:
     """Get confirmation keyboard for product deletion"""
     keyboard = InlineKeyboardMarkup(
@@ -146,114 +193,78 @@ def get_admin_confirm_delete_keyboard(product_id) -> InlineKeyboardMarkup:
                     callback_data=f"admin_confirm_delete:{product_id}"
                 )
             ],
-            [
-                InlineKeyboardButton(
-                    text="❌ Нет, отмена",
-                    callback_data="admin_manage_products"
-                )
-            ]
+            _row("❌ Нет, отмена", callback_data="admin_manage_products")
         ]
     )
     return keyboard
 
 
+_PROFILE_KB = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        _row("🛍 Мои покупки", callback_data="my_purchases"),
+        _row("💰 Баланс", callback_data="show_balance"),
+        _row("📚 Перейти в каталог", callback_data="open_catalog")
+    ]
+)
+
+
 def get_profile_keyboard() -> InlineKeyboardMarkup:
     """Get profile menu keyboard"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="🛍 Мои покупки", callback_data="my_purchases")
-            ],
-            [
-                InlineKeyboardButton(text="💰 Баланс", callback_data="show_balance")
-            ],
-            [
-                InlineKeyboardButton(text="📚 Перейти в каталог", callback_data="open_catalog")
-            ]
-        ]
-    )
-    return keyboard
+    return _PROFILE_KB
 
 
 def get_categories_keyboard(categories) -> InlineKeyboardMarkup:
     """Get categories keyboard"""
-    buttons = []
-
-    # Add category buttons
-    for category in categories:
-        buttons.append([
-            InlineKeyboardButton(text=category.name, callback_data=f"category:{category.id}")
-        ])
-
-    # Add "All Products" button
-    buttons.append([
-        InlineKeyboardButton(text="Все товары", callback_data="all_products")
-    ])
+    IKB = InlineKeyboardButton.model_construct  # local alias for the button loop
 
-    # Add "Back to Menu" button
-    buttons.append([
-        InlineKeyboardButton(text="Назад в меню", callback_data="back_to_menu")
-    ])
+    # Add category buttons, followed by "All Products" and "Back to Menu"
+    rows = [
+        [
+            IKB(text=category.name, callback_data=f"category:{category.id}")
+        ]
+        for category in categories
+    ]
 
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=rows + _CATEGORIES_TRAILER)
 
 
 def get_products_keyboard(products) -> InlineKeyboardMarkup:
     """Get products keyboard"""
-    buttons = []
-
-    # Add product buttons (up to 10 products per page for simplicity)
-    for product in products[:10]:
-        buttons.append([
-            InlineKeyboardButton(
-                text=f"{product.title} - {product.price:.2f} монет",
-                callback_data=f"product:{product.id}"
-            )
-        ])
+    # Add product buttons (up to one page of products for simplicity)
+    if len(products) > PRODUCTS_KEYBOARD_LIMIT:
+        products = islice(products, PRODUCTS_KEYBOARD_LIMIT)
+    IKB = InlineKeyboardButton.model_construct  # local alias for the button loop
+    prefix = PRODUCT_CB_PREFIX
+    buttons = [
+        [IKB(text=_product_label(product.title, product.price),
+             callback_data=sys.intern(prefix + str(product.id)))]
+        for product in products
+    ]
 
     # Add navigation buttons
-    buttons.append([
-        InlineKeyboardButton(text="Назад к категориям", callback_data="back_to_categories")
-    ])
-
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+    buttons.append(_BACK_TO_CATEGORIES_ROW)
 
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=buttons)
 
-def get_paginated_products_keyboard(products, current_page, per_page) -> InlineKeyboardMarkup:
-    """Get products keyboard with pagination"""
-    buttons = []
-
-    # Calculate start and end indices for the current page
-    start_idx = current_page * per_page
-    end_idx = min(start_idx + per_page, len(products))
 
-    # Get total number of pages
-    total_pages = math.ceil(len(products) / per_page)
-
-    # Add product buttons for the current page
-    for product in products[start_idx:end_idx]:
-        buttons.append([
-            InlineKeyboardButton(
-                text=f"{product.title} - {product.price:.2f} монет",
-                callback_data=f"product:{product.id}"
-            )
-        ])
-
-    # Add pagination buttons
+@lru_cache(maxsize=1024)
+def _pagination_row(category_id: int, current_page: int, total_pages: int) -> list:
+    """Get the shared prev / page indicator / next row for a catalog page"""
+    IKB = InlineKeyboardButton.model_construct  # local alias for the button loop
     pagination_buttons = []
 
     # Add "Previous" button if not on the first page
     if current_page > 0:
         pagination_buttons.append(
-            InlineKeyboardButton(
+            IKB(
                 text="◀️ Предыдущая",
-                callback_data=f"pagination:0:{current_page - 1}"
+                callback_data=PaginationCB(category_id=category_id, page=current_page - 1).pack()
             )
         )
 
     # Add page indicator
     pagination_buttons.append(
-        InlineKeyboardButton(
+        IKB(
             text=f"📄 {current_page + 1}/{total_pages}",
             callback_data="none"  # This button does nothing when clicked
         )
@@ -262,23 +273,40 @@ def get_paginated_products_keyboard(products, current_page, per_page) -> InlineK
     # Add "Next" button if not on the last page
     if current_page < total_pages - 1:
         pagination_buttons.append(
-            InlineKeyboardButton(
+            IKB(
                 text="Следующая ▶️",
-                callback_data=f"pagination:0:{current_page + 1}"
+                callback_data=PaginationCB(category_id=category_id, page=current_page + 1).pack()
             )
         )
 
-    if pagination_buttons:
-        buttons.append(pagination_buttons)
+    return pagination_buttons
 
-    # Add navigation buttons
-    buttons.append([
-        InlineKeyboardButton(text="Назад к категориям", callback_data="back_to_categories")
-    ])
 
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+def get_paginated_products_keyboard(page_products, current_page, total_pages, category_id=0) -> InlineKeyboardMarkup:
+    """Get keyboard for one already fetched page of products with pagination"""
+    # Every field below is built from our own data, so skip pydantic validation
+    IKB = InlineKeyboardButton.model_construct  # local alias for the button loop
 
+    # Add product buttons for the current page; callback strings are interned
+    # so rebuilt keyboards share them instead of allocating new copies
+    prefix = PRODUCT_CB_PREFIX
+    rows = [
+        [
+            IKB(
+                text=_product_label(product.title, product.price),
+                callback_data=sys.intern(prefix + str(product.id))
+            )
+        ]
+        for product in page_products
+    ]
+
+    # Pagination row goes after the products, followed by the navigation row
+    return InlineKeyboardMarkup.model_construct(
+        inline_keyboard=rows + [_pagination_row(category_id, current_page, total_pages), _BACK_TO_CATEGORIES_ROW]
+    )
 
+
+@lru_cache(maxsize=1024)
 def get_product_details_keyboard(product_id) -> InlineKeyboardMarkup:
     """Get product details keyboard with buy button"""
     keyboard = InlineKeyboardMarkup(
@@ -286,14 +314,13 @@ def get_product_details_keyboard(product_id) -> InlineKeyboardMarkup:
             [
                 InlineKeyboardButton(text="🛒 Купить", callback_data=f"buy_product:{product_id}")
             ],
-            [
-                InlineKeyboardButton(text="Назад к товарам", callback_data="back_to_products")
-            ]
+            _row("Назад к товарам", callback_data="back_to_products")
         ]
     )
     return keyboard
 
 
+@lru_cache(maxsize=1024)
 def get_purchase_confirmation_keyboard(product_id) -> InlineKeyboardMarkup:
     """Get purchase confirmation keyboard"""
     keyboard = InlineKeyboardMarkup(
@@ -301,231 +328,168 @@ def get_purchase_confirmation_keyboard(product_id) -> InlineKeyboardMarkup:
             [
                 InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"confirm_purchase:{product_id}")
             ],
-            [
-                InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_purchase")
-            ]
+            _row("❌ Отмена", callback_data="cancel_purchase")
         ]
     )
     return keyboard
 
 
+_BACK_KB = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        _row("↩️ Назад", callback_data="admin_back")
+    ]
+)
+
+
 def get_back_keyboard() -> InlineKeyboardMarkup:
     """Simple back keyboard"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="↩️ Назад", callback_data="admin_back")
-            ]
-        ]
-    )
-    return keyboard
+    return _BACK_KB
+
+
+_BALANCE_TOPUP_KB = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        _row("500 монет (~$5)", callback_data="topup:500"),
+        _row("1000 монет (~$10)", callback_data="topup:1000"),
+        _row("3000 монет (~$30)", callback_data="topup:3000"),
+        _row("10000 монет (~$100)", callback_data="topup:10000"),
+        _row("↩️ Назад", callback_data="show_balance")
+    ]
+)
 
 
 def get_balance_topup_keyboard() -> InlineKeyboardMarkup:
     """Get keyboard with balance top-up options"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text="500 монет (~$5)",
-                    callback_data="topup:500"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="1000 монет (~$10)",
-                    callback_data="topup:1000"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="3000 монет (~$30)",
-                    callback_data="topup:3000"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="10000 монет (~$100)",
-                    callback_data="topup:10000"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="↩️ Назад",
-                    callback_data="show_balance"
-                )
-            ]
-        ]
-    )
-    return keyboard
+    return _BALANCE_TOPUP_KB
+
+
+_PAYMENT_METHODS_KB = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        _row("💎 CryptoCloud", callback_data="payment_method:cryptocloud"),
+        _row("❌ Отмена", callback_data="cancel_payment")
+    ]
+)
 
 
 def get_payment_methods_keyboard() -> InlineKeyboardMarkup:
     """Get keyboard with payment methods - only CryptoCloud now"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text="💎 CryptoCloud",
-                    callback_data="payment_method:cryptocloud"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="❌ Отмена",
-                    callback_data="cancel_payment"
-                )
-            ]
-        ]
-    )
-    return keyboard
+    return _PAYMENT_METHODS_KB
+
+
+# Pay button skeleton; each payment copies it with its own invoice URL
+_PAY_NOW_BUTTON = InlineKeyboardButton(text="💳 Оплатить сейчас", url="https://cryptocloud.plus")
 
 
 def get_payment_link_keyboard(payment_link: str) -> InlineKeyboardMarkup:
     """Get keyboard with payment link button"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text="💳 Оплатить сейчас",
-                    url=payment_link
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="↩️ Назад в главное меню",
-                    callback_data="back_to_menu"
-                )
-            ]
-        ]
-    )
-    return keyboard
+    # The link comes from the CryptoCloud invoice response, so only the URL is
+    # swapped into a copy of the skeleton and the back row is shared
+    pay_row = [_PAY_NOW_BUTTON.model_copy(update={"url": payment_link})]
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=[pay_row, _BACK_TO_MAIN_MENU_ROW])
+
+
+_PAYMENT_CONFIRMATION_KB = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        _row("💳 Оплатить сейчас", callback_data="confirm_payment"),
+        _row("❌ Отмена", callback_data="cancel_payment")
+    ]
+)
 
 
 def get_payment_confirmation_keyboard() -> InlineKeyboardMarkup:
     """Get payment confirmation keyboard"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text="💳 Оплатить сейчас",
-                    callback_data="confirm_payment"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="❌ Отмена",
-                    callback_data="cancel_payment"
-                )
-            ]
-        ]
-    )
-    return keyboard
+    return _PAYMENT_CONFIRMATION_KB
+
+
+_BALANCE_KB = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        _row("💳 Пополнить баланс", callback_data="topup_balance"),
+        _row("📚 Перейти в каталог", callback_data="open_catalog"),
+        _row("↩️ Назад в главное меню", callback_data="back_to_menu")
+    ]
+)
 
 
 def get_balance_keyboard() -> InlineKeyboardMarkup:
     """Get balance page keyboard with top-up option"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text="💳 Пополнить баланс",
-                    callback_data="topup_balance"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="📚 Перейти в каталог",
-                    callback_data="open_catalog"
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="↩️ Назад в главное меню",
-                    callback_data="back_to_menu"
-                )
-            ]
-        ]
-    )
-    return keyboard
+    return _BALANCE_KB
 
 
+@lru_cache(maxsize=4)
 def get_support_keyboard(admin_contact: str) -> InlineKeyboardMarkup:
     """Get support menu keyboard with contact button"""
+    url = f"https://t.me/{admin_contact.lstrip('@')}"
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
             [
-                InlineKeyboardButton(
-                    text="📩 Связаться с поддержкой",
-                    url=f"https://t.me/{admin_contact.lstrip('@')}"
-                )
+                InlineKeyboardButton(text="📩 Связаться с поддержкой", url=url)
             ],
-            [
-                InlineKeyboardButton(
-                    text="↩️ Назад в главное меню",
-                    callback_data="back_to_menu"
-                )
-            ]
+            _BACK_TO_MAIN_MENU_ROW
         ]
     )
     return keyboard
 
 
+_BACKUP_KB = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        _row("📥 Скачать резервную копию", callback_data="admin_download_backup"),
+        _row("↩️ Назад в панель администратора", callback_data="admin_back")
+    ]
+)
+
+
 def get_backup_keyboard() -> InlineKeyboardMarkup:
     """Get backup database keyboard"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="📥 Скачать резервную копию", callback_data="admin_download_backup")
-            ],
-            [
-                InlineKeyboardButton(text="↩️ Назад в панель администратора", callback_data="admin_back")
-            ]
-        ]
-    )
-    return keyboard
+    return _BACKUP_KB
+
+
+_NEWSLETTER_MAIN_KB = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        _row("📝 Создать рассылку", callback_data="create_newsletter"),
+        _row("📋 Мои рассылки", callback_data="my_newsletters"),
+        _row("↩️ Назад в панель администратора", callback_data="admin_back")
+    ]
+)
 
 
 def get_newsletter_main_keyboard() -> InlineKeyboardMarkup:
     """Get newsletter main menu keyboard"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="📝 Создать рассылку", callback_data="create_newsletter")
-            ],
-            [
-                InlineKeyboardButton(text="📋 Мои рассылки", callback_data="my_newsletters")
-            ],
-            [
-                InlineKeyboardButton(text="↩️ Назад в панель администратора", callback_data="admin_back")
-            ]
-        ]
-    )
-    return keyboard
+    return _NEWSLETTER_MAIN_KB
+
+
+# Shown while there are no newsletters yet: just the page indicator and back button
+_EMPTY_NEWSLETTER_KB = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        _row("📄 1/1", callback_data="none"),
+        _row("↩️ Назад", callback_data="admin_newsletter")
+    ]
+)
 
 
 def get_newsletter_list_keyboard(newsletters, page=0, per_page=5) -> InlineKeyboardMarkup:
     """Get keyboard with list of newsletters and pagination"""
-    buttons = []
+    if not newsletters:
+        return _EMPTY_NEWSLETTER_KB
 
-    # Calculate start and end indices for the current page
-    start_idx = page * per_page
-    end_idx = min(start_idx + per_page, len(newsletters))
+    # Every field below is built from our own data, so skip pydantic validation
+    IKB = InlineKeyboardButton.model_construct  # local alias for the button loop
+    n = len(newsletters)
 
-    # Get total number of pages
-    total_pages = math.ceil(len(newsletters) / per_page) if newsletters else 1
+    # Calculate the start index for the current page
+    start_idx = page * per_page
 
-    # Add newsletter buttons for the current page
-    for newsletter in newsletters[start_idx:end_idx]:
-        # Show status emoji
-        status_emoji = "✅" if newsletter.status == "sent" else "📝"
+    # Get total number of pages (integer ceiling division, at least one page)
+    total_pages = max(1, (n + per_page - 1) // per_page)
 
-        buttons.append([
-            InlineKeyboardButton(
-                text=f"{status_emoji} {newsletter.title}",
+    # Add newsletter buttons for the current page, with a status emoji
+    rows = [
+        [
+            IKB(
+                text=f"{'✅' if newsletter.status == 'sent' else '📝'} {newsletter.title}",
                 callback_data=f"view_newsletter:{newsletter.id}"
             )
-        ])
+        ]
+        for newsletter in islice(newsletters, start_idx, start_idx + per_page)
+    ]
 
     # Add pagination buttons
     pagination_buttons = []
@@ -533,7 +497,7 @@ def get_newsletter_list_keyboard(newsletters, page=0, per_page=5) -> InlineKeybo
     # Add "Previous" button if not on the first page
     if page > 0:
         pagination_buttons.append(
-            InlineKeyboardButton(
+            IKB(
                 text="◀️ Предыдущая",
                 callback_data=f"newsletter_page:{page - 1}"
             )
@@ -541,32 +505,28 @@ def get_newsletter_list_keyboard(newsletters, page=0, per_page=5) -> InlineKeybo
 
     # Add page indicator
     pagination_buttons.append(
-        InlineKeyboardButton(
+        IKB(
             text=f"📄 {page + 1}/{total_pages}",
             callback_data="none"
         )
     )
 
     # Add "Next" button if not on the last page
-    if newsletters and page < total_pages - 1:
+    if page < total_pages - 1:
         pagination_buttons.append(
-            InlineKeyboardButton(
+            IKB(
                 text="Следующая ▶️",
                 callback_data=f"newsletter_page:{page + 1}"
             )
         )
 
-    if pagination_buttons:
-        buttons.append(pagination_buttons)
-
-    # Add back button
-    buttons.append([
-        InlineKeyboardButton(text="↩️ Назад", callback_data="admin_newsletter")
-    ])
-
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+    # Pagination row goes after the newsletters, followed by the back button
+    return InlineKeyboardMarkup.model_construct(
+        inline_keyboard=rows + [pagination_buttons, _BACK_NEWSLETTER_ROW]
+    )
 
 
+@lru_cache(maxsize=512)
 def get_newsletter_detail_keyboard(newsletter_id: int, newsletter_status: str) -> InlineKeyboardMarkup:
     """Get keyboard for newsletter details"""
     buttons = []
@@ -582,103 +542,69 @@ def get_newsletter_detail_keyboard(newsletter_id: int, newsletter_status: str) -
     buttons.append([
         InlineKeyboardButton(text="🗑 Удалить", callback_data=f"delete_newsletter:{newsletter_id}")
     ])
-    buttons.append([
-        InlineKeyboardButton(text="↩️ Назад к списку", callback_data="my_newsletters")
-    ])
+    buttons.append(_row("↩️ Назад к списку", callback_data="my_newsletters"))
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+_CANCEL_NEWSLETTER_ROW = _row("↩️ Отмена", callback_data="cancel_newsletter")
+
+
+@lru_cache(maxsize=8)
+def _newsletter_step_keyboard(skip_text=None, skip_callback=None) -> InlineKeyboardMarkup:
+    """Build a newsletter creation step keyboard: optional skip button, then cancel"""
+    rows = []
+    if skip_text:
+        rows.append(_row(skip_text, callback_data=skip_callback))
+    rows.append(_CANCEL_NEWSLETTER_ROW)
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=rows)
+
+
 def get_newsletter_creation_keyboard() -> InlineKeyboardMarkup:
     """Get keyboard for newsletter creation process"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="↩️ Отмена", callback_data="cancel_newsletter")
-            ]
-        ]
-    )
-    return keyboard
+    return _newsletter_step_keyboard()
 
 
 def get_newsletter_photo_keyboard() -> InlineKeyboardMarkup:
     """Get keyboard for the photo step of newsletter creation"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="⏩ Пропустить фото", callback_data="skip_newsletter_photo")
-            ],
-            [
-                InlineKeyboardButton(text="↩️ Отмена", callback_data="cancel_newsletter")
-            ]
-        ]
-    )
-    return keyboard
+    return _newsletter_step_keyboard("⏩ Пропустить фото", "skip_newsletter_photo")
 
 
 def get_newsletter_file_keyboard() -> InlineKeyboardMarkup:
     """Get keyboard for the file step of newsletter creation"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="⏩ Пропустить вложение файла", callback_data="skip_newsletter_file")
-            ],
-            [
-                InlineKeyboardButton(text="↩️ Отмена", callback_data="cancel_newsletter")
-            ]
-        ]
-    )
-    return keyboard
+    return _newsletter_step_keyboard("⏩ Пропустить вложение файла", "skip_newsletter_file")
 
 
 def get_newsletter_button_keyboard() -> InlineKeyboardMarkup:
     """Get keyboard for the button step of newsletter creation"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="⏩ Пропустить кнопку", callback_data="skip_newsletter_button")
-            ],
-            [
-                InlineKeyboardButton(text="↩️ Отмена", callback_data="cancel_newsletter")
-            ]
-        ]
-    )
-    return keyboard
+    return _newsletter_step_keyboard("⏩ Пропустить кнопку", "skip_newsletter_button")
+
+
+# (text, callback_data) of each newsletter preview row, in display order
+_NEWSLETTER_PREVIEW_ROWS = (
+    ("📝 Редактировать заголовок", "edit_newsletter_title"),
+    ("📝 Редактировать сообщение", "edit_newsletter_message"),
+    ("📝 Редактировать фото", "edit_newsletter_photo"),
+    ("📝 Редактировать файл", "edit_newsletter_file"),
+    ("📝 Редактировать кнопку", "edit_newsletter_button"),
+    ("💾 Сохранить черновик", "save_newsletter_draft"),
+    ("🚀 Отправить сейчас", "confirm_send_newsletter"),
+    ("↩️ Отмена", "cancel_newsletter"),
+)
+_NEWSLETTER_PREVIEW_KB = InlineKeyboardMarkup.model_construct(
+    inline_keyboard=[
+        _row(text, callback_data=callback_data)
+        for text, callback_data in _NEWSLETTER_PREVIEW_ROWS
+    ]
+)
 
 
 def get_newsletter_preview_keyboard() -> InlineKeyboardMarkup:
     """Get keyboard for newsletter preview"""
-    keyboard = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(text="📝 Редактировать заголовок", callback_data="edit_newsletter_title")
-            ],
-            [
-                InlineKeyboardButton(text="📝 Редактировать сообщение", callback_data="edit_newsletter_message")
-            ],
-            [
-                InlineKeyboardButton(text="📝 Редактировать фото", callback_data="edit_newsletter_photo")
-            ],
-            [
-                InlineKeyboardButton(text="📝 Редактировать файл", callback_data="edit_newsletter_file")
-            ],
-            [
-                InlineKeyboardButton(text="📝 Редактировать кнопку", callback_data="edit_newsletter_button")
-            ],
-            [
-                InlineKeyboardButton(text="💾 Сохранить черновик", callback_data="save_newsletter_draft")
-            ],
-            [
-                InlineKeyboardButton(text="🚀 Отправить сейчас", callback_data="confirm_send_newsletter")
-            ],
-            [
-                InlineKeyboardButton(text="↩️ Отмена", callback_data="cancel_newsletter")
-            ]
-        ]
-    )
-    return keyboard
+    return _NEWSLETTER_PREVIEW_KB
 
 
+@lru_cache(maxsize=512)
 def get_newsletter_confirm_delete_keyboard(newsletter_id: int) -> InlineKeyboardMarkup:
     """Get confirmation keyboard for newsletter deletion"""
     keyboard = InlineKeyboardMarkup(
@@ -700,6 +626,7 @@ def get_newsletter_confirm_delete_keyboard(newsletter_id: int) -> InlineKeyboard
     return keyboard
 
 
+@lru_cache(maxsize=32)
 def get_newsletter_button_preview(text: str, url: str) -> InlineKeyboardMarkup:
     """Get preview of the newsletter button"""
     keyboard = InlineKeyboardMarkup(
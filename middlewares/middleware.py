@@ -15,9 +15,9 @@ class LoggingMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        # Log incoming message if it's a Message object
-        if isinstance(event, Message) and event.text:
-            logger.info(f"Received message from {event.from_user.id}: {event.text}")
+        # Log incoming message if it's a Message object and INFO logging is on
+        if isinstance(event, Message) and event.text and logger.isEnabledFor(logging.INFO):
+            logger.info("Received message from %s: %s", event.from_user.id, event.text)
         
         # Process the event through handler
         return await handler(event, data)
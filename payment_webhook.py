@@ -1,14 +1,26 @@
-from flask import Flask, request, jsonify
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector
+import asyncio
+import base64
+import hashlib
+import hmac
 import logging
 import os
-import jwt
-import requests
-import json
-import asyncio
+import re
+import sys
+from bisect import bisect_left
+import orjson
+from cachetools import TLRUCache
+import time
 from datetime import datetime
 
 from config import load_config
-from database.methods import add_user_balance
+from database.methods import (
+    init_db,
+    add_pending_payment,
+    credit_pending_payment,
+    mark_pending_payment_failed,
+    get_pending_payments
+)
 
 # Configure logging
 logging.basicConfig(
@@ -25,37 +37,152 @@ logger = logging.getLogger(__name__)
 config = load_config()
 SECRET_KEY = os.getenv('CRYPTOCLOUD_SECRET_KEY', '')
 BOT_TOKEN = config.bot_token
+SEND_MESSAGE_URL = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
 DEFAULT_ADMIN_ID = os.getenv('DEFAULT_ADMIN_ID', '0')  # For fallback
+ADMIN_IDS = config.admin_ids
+
+# HS256 secret, encoded once instead of on every webhook
+_SECRET_BYTES = SECRET_KEY.encode('utf-8')
+
+# Payloads of tokens that already passed verification, so CryptoCloud retries
+# of the same callback skip the decode; failures are never cached
+TOKEN_CACHE_TTL = 30
 
-app = Flask(__name__)
+def _token_cache_expiry(token, payload, now):
+    """Keep a verified token for TOKEN_CACHE_TTL seconds, never past its exp claim"""
+    ttl = TOKEN_CACHE_TTL
+    exp = payload.get('exp')
+    if exp is not None:
+        ttl = min(ttl, exp - time.time())
+    return now + ttl
+
+_verified_tokens = TLRUCache(maxsize=4096, ttu=_token_cache_expiry)
+
+# Our invoices put coin_amount into a flat add_fields object as a plain
+# integer (or integer string), so it can be pulled out without parsing the
+# whole JSON object; any other shape falls back to parse_add_fields
+_COIN_RE = re.compile(r'"coin_amount"\s*:\s*(?:"(\d+)"|(\d+))\s*[,}]')
+
+# Our order ids look like tg_<telegram id>_<hash>
+_ORDER_RE = re.compile(r'tg_([0-9]+)_')
+
+# Coin packages by price in USD, mirrors the packages in handlers/payment.py
+COIN_PACKAGES = {
+    5: 500,
+    10: 1000,
+    30: 3000,
+    100: 10000
+}
+_PACKAGE_PRICES = sorted(COIN_PACKAGES)
+# Midpoints between neighbouring prices, an amount on a midpoint goes to the cheaper package
+_PACKAGE_BOUNDS = [(low + high) / 2 for low, high in zip(_PACKAGE_PRICES, _PACKAGE_PRICES[1:])]
+
+# Payment notification, filled with (amount_crypto, currency, coin_amount,
+# old_balance, new_balance); %s keeps the values' own str() formatting
+PAYMENT_NOTIFICATION_TEMPLATE = (
+    "✅ <b>Payment Successful!</b>\n\n"
+    "Your payment of %s %s has been received.\n"
+    "%s coins have been added to your balance.\n\n"
+    "Old balance: %s coins\n"
+    "New balance: %s coins\n\n"
+    "Thank you for your purchase!"
+)
+
+# Shared HTTP session for Telegram calls, opened in on_startup
+http_session: ClientSession | None = None
+
+# Accepted payments waiting for the balance update and notification,
+# drained by PAYMENT_WORKERS background tasks started in on_startup.
+# Every payment is stored in pending_payments before it is acknowledged,
+# so the queue only holds ids of rows that are already durable
+PAYMENT_WORKERS = 4
+payment_queue: asyncio.Queue | None = None
+payment_workers: list[asyncio.Task] = []
+# Ids of stored payments currently queued or being credited
+queued_payments: set[int] = set()
+
+# Stored payments are re-scanned every PENDING_RETRY_INTERVAL seconds; a
+# payment that fails MAX_PAYMENT_ATTEMPTS times is left for the admins
+PENDING_RETRY_INTERVAL = 60
+MAX_PAYMENT_ATTEMPTS = 5
+retry_task: asyncio.Task | None = None
+
+# Notifications for the same user within NOTIFY_WINDOW seconds are merged
+# into a single Telegram message
+NOTIFY_WINDOW = 0.25
+pending_notifications: dict[int, list[str]] = {}
+notification_tasks: set[asyncio.Task] = set()
+
+def json_response(data, status=200):
+    """Build a JSON response serialized with orjson"""
+    return web.Response(body=orjson.dumps(data), status=status, content_type='application/json')
+
+def _b64url_decode(segment):
+    """Decode a base64url JWT segment, restoring the stripped padding"""
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
 
 def verify_token(token, invoice_id):
-    """Verify the JWT token from CryptoCloud"""
+    """Verify the JWT token from CryptoCloud, returns (valid, payload or None)"""
     try:
         if not SECRET_KEY:
             logger.warning("SECRET_KEY not set, skipping token verification")
-            return True
+            return True, None
+        
+        if not token:
+            logger.error("Token verification failed: empty token")
+            return False, None
+        
+        cached = _verified_tokens.get(token)
+        if cached is not None:
+            return True, cached
             
-        decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        # CryptoCloud signs with HS256, so check the signature directly
+        header_b64, payload_b64, signature_b64 = token.split('.')
+        header = orjson.loads(_b64url_decode(header_b64))
+        if not isinstance(header, dict) or header.get('alg') != 'HS256':
+            logger.error("Token verification failed: unsupported header %s", header)
+            return False, None
+        
+        expected = hmac.new(_SECRET_BYTES, f"{header_b64}.{payload_b64}".encode('ascii'), hashlib.sha256).digest()
+        if not hmac.compare_digest(_b64url_decode(signature_b64), expected):
+            logger.error("Token verification failed: signature mismatch")
+            return False, None
+        
+        decoded = orjson.loads(_b64url_decode(payload_b64))
+        if not isinstance(decoded, dict):
+            logger.error("Token verification failed: payload is not a JSON object")
+            return False, None
+        
+        # Same time claims PyJWT checks: exp, nbf and iat must be numbers,
+        # the token must not be expired or used before nbf
+        now = time.time()
+        for claim in ('exp', 'nbf', 'iat'):
+            value = decoded.get(claim)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                logger.error("Token verification failed: %s is not a number", claim)
+                return False, None
+        if 'exp' in decoded and decoded['exp'] <= now:
+            logger.error("Token verification failed: token expired")
+            return False, None
+        if 'nbf' in decoded and decoded['nbf'] > now:
+            logger.error("Token verification failed: token not yet valid")
+            return False, None
+        
         # The token should contain the invoice UUID
         if 'id' in decoded:
-            return True
-        return False
+            _verified_tokens[token] = decoded
+            return True, decoded
+        return False, None
     except Exception as e:
-        logger.error(f"Token verification failed: {e}")
-        return False
-
-def update_user_balance(user_id, amount):
-    """Sync wrapper for add_user_balance"""
-    return asyncio.run(add_user_balance(user_id, amount))
+        logger.error("Token verification failed: %s", e)
+        return False, None
 
-def send_telegram_notification(user_id, message):
+async def send_telegram_notification(user_id, message):
     """Send a notification to the user via Telegram"""
     if not BOT_TOKEN:
         logger.error("BOT_TOKEN not set, cannot send notification")
         return False
         
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": user_id,
         "text": message,
@@ -63,65 +190,96 @@ def send_telegram_notification(user_id, message):
     }
     
     try:
-        response = requests.post(url, json=payload)
-        if response.status_code == 200:
-            logger.info(f"Notification sent to user {user_id}")
-            return True
-        else:
-            logger.error(f"Failed to send notification: {response.status_code} - {response.text}")
-            return False
+        async with http_session.post(SEND_MESSAGE_URL, json=payload) as response:
+            if response.status == 200:
+                logger.info("Notification sent to user %s", user_id)
+                return True
+            else:
+                logger.error("Failed to send notification: %s - %s", response.status, await response.text())
+                return False
     except Exception as e:
-        logger.error(f"Error sending notification: {e}")
+        logger.error("Error sending notification: %s", e)
         return False
 
+def queue_notification(user_id, message):
+    """Schedule a notification, merging it with others for the same user"""
+    messages = pending_notifications.get(user_id)
+    if messages is not None:
+        messages.append(message)
+        return
+    
+    pending_notifications[user_id] = [message]
+    task = asyncio.create_task(flush_notifications(user_id))
+    notification_tasks.add(task)
+    task.add_done_callback(notification_done)
+
+def notification_done(task):
+    """Forget a finished flush task and log its error, if any"""
+    notification_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Notification task failed: %s", task.exception())
+
+async def flush_notifications(user_id):
+    """Send everything queued for the user once the window closes"""
+    await asyncio.sleep(NOTIFY_WINDOW)
+    messages = pending_notifications.pop(user_id)
+    notification_sent = await send_telegram_notification(user_id, "\n\n".join(messages))
+    logger.info("Notification sent: %s (%s merged)", notification_sent, len(messages))
+
 def parse_order_id(order_id):
     """Parse user_id from order_id format tg_userID_hash"""
-    try:
-        if not order_id:
-            return None, False
-            
-        # Parse the format tg_userID_hash
-        if order_id.startswith("tg_"):
-            parts = order_id.split('_')
-            if len(parts) >= 3:
-                return int(parts[1]), True
-                
-        # If not in our format, log it and return None
-        logger.warning(f"Order ID not in expected format: {order_id}")
-        return None, False
-    except Exception as e:
-        logger.error(f"Error parsing order_id '{order_id}': {e}")
+    if not order_id:
         return None, False
+        
+    # Parse the format tg_userID_hash
+    match = _ORDER_RE.match(order_id)
+    if match:
+        return int(match.group(1)), True
+            
+    # If not in our format, log it and return None
+    logger.warning("Order ID not in expected format: %s", order_id)
+    return None, False
 
 def estimate_coin_amount(amount_value):
     """Estimate coin amount based on payment amount"""
     try:
         amount_value = float(amount_value)
-        # Simple mapping - adjust based on your actual pricing
-        coin_packages = {
-            5: 500,   # ~$25 = 500 coins
-            10: 1000,  # ~$50 = 1000 coins
-            30: 3000, # ~$150 = 3000 coins
-            100: 10000 # ~$500 = 10000 coins
-        }
         
         # Find closest package by price
-        closest_price = min(coin_packages.keys(), key=lambda x: abs(x - amount_value))
-        coin_amount = coin_packages[closest_price]
+        closest_price = _PACKAGE_PRICES[bisect_left(_PACKAGE_BOUNDS, amount_value)]
+        coin_amount = COIN_PACKAGES[closest_price]
         
-        logger.info(f"Estimated coin_amount from payment amount {amount_value}: {coin_amount}")
+        logger.info("Estimated coin_amount from payment amount %s: %s", amount_value, coin_amount)
         return coin_amount
     except Exception as e:
-        logger.warning(f"Failed to estimate coin_amount: {e}")
+        logger.warning("Failed to estimate coin_amount: %s", e)
         return 500  # Default fallback
 
-@app.route('/payment/webhook', methods=['POST'])
-def handle_webhook():
+def parse_add_fields(add_fields_str):
+    """Parse the add_fields JSON object, returning {} if it is empty or malformed"""
+    if add_fields_str in ('', '{}'):
+        return {}
+    
+    try:
+        add_fields = orjson.loads(add_fields_str)
+    except orjson.JSONDecodeError as e:
+        logger.warning("Error parsing add_fields: %s", e)
+        return {}
+    
+    if not isinstance(add_fields, dict):
+        logger.warning("add_fields is not a JSON object: %s", add_fields_str)
+        return {}
+    
+    logger.info("Parsed add_fields: %s", add_fields)
+    return add_fields
+
+async def handle_webhook(request):
     """Handle payment webhook from CryptoCloud"""
     try:
         # Get form data and log it for debugging
-        form_data = request.form
-        logger.info(f"Received webhook form data keys: {list(form_data.keys())}")
+        form_data = await request.post()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Received webhook form data keys: %s", list(form_data.keys()))
         
         # Check if the webhook is missing order_id
         if 'order_id' not in form_data:
@@ -136,96 +294,214 @@ def handle_webhook():
         currency = form_data.get('currency', 'Unknown')
         
         # Log the extracted data
-        logger.info(f"Payment info - Status: {status}, Invoice: {invoice_id}, Order ID: {order_id}")
+        logger.info("Payment info - Status: %s, Invoice: %s, Order ID: %s", status, invoice_id, order_id)
         
         # Verify payment status
         if status != 'success':
-            logger.warning(f"Payment not successful: {status}")
-            return jsonify({'status': 'error', 'message': 'Invalid payment status'}), 400
+            logger.warning("Payment not successful: %s", status)
+            return json_response({'status': 'error', 'message': 'Invalid payment status'}, status=400)
         
         # Try to verify token
-        token_valid = verify_token(token, invoice_id)
-        logger.info(f"Token verification result: {token_valid}")
+        token_valid, token_payload = verify_token(token, invoice_id)
+        logger.info("Token verification result: %s (token invoice: %s)",
+                    token_valid, token_payload.get('id') if token_payload else None)
         
         # Parse order_id to get user_id
         user_id, success = parse_order_id(order_id)
-        logger.info(f"Parsed user_id from order_id: {user_id if user_id else 'None'} (success: {success})")
+        logger.info("Parsed user_id from order_id: %s (success: %s)", user_id or 'None', success)
         
-        # Get coin amount from add_fields
+        # Get coin amount from add_fields, parsing the JSON only if the regex misses
         coin_amount = 0
+        add_fields = None
         add_fields_str = form_data.get('add_fields', '{}')
-        try:
-            add_fields = json.loads(add_fields_str)
-            logger.info(f"Parsed add_fields: {add_fields}")
-            
+        match = _COIN_RE.search(add_fields_str) if add_fields_str.count('{') == 1 else None
+        if match:
+            coin_amount = int(match.group(1) or match.group(2))
+            logger.info("Found coin_amount in add_fields: %s", coin_amount)
+        else:
+            add_fields = parse_add_fields(add_fields_str)
             if 'coin_amount' in add_fields:
-                coin_amount = int(add_fields['coin_amount'])
-                logger.info(f"Found coin_amount in add_fields: {coin_amount}")
-        except Exception as e:
-            logger.warning(f"Error processing add_fields: {e}")
+                try:
+                    coin_amount = int(add_fields['coin_amount'])
+                    logger.info("Found coin_amount in add_fields: %s", coin_amount)
+                except (TypeError, ValueError) as e:
+                    logger.warning("Error processing add_fields: %s", e)
         
         # Fallback if we didn't get a user_id from order_id
         if not user_id:
             # Try to get from add_fields
-            try:
-                if 'user_id' in add_fields:
+            if add_fields is None:
+                add_fields = parse_add_fields(add_fields_str)
+            if 'user_id' in add_fields:
+                try:
                     user_id = int(add_fields['user_id'])
-                    logger.info(f"Got user_id from add_fields: {user_id}")
-            except Exception as e:
-                logger.warning(f"Error getting user_id from add_fields: {e}")
+                    logger.info("Got user_id from add_fields: %s", user_id)
+                except (TypeError, ValueError) as e:
+                    logger.warning("Error getting user_id from add_fields: %s", e)
                 
             # If still no user_id, use default admin
             if not user_id:
                 if DEFAULT_ADMIN_ID.isdigit():
                     user_id = int(DEFAULT_ADMIN_ID)
-                    logger.warning(f"Using default admin as fallback user_id: {user_id}")
+                    logger.warning("Using default admin as fallback user_id: %s", user_id)
                 else:
                     logger.error("Could not determine user_id and no valid default admin is set")
-                    return jsonify({'status': 'error', 'message': 'Invalid or missing user ID'}), 400
+                    return json_response({'status': 'error', 'message': 'Invalid or missing user ID'}, status=400)
         
         # If we don't have a coin_amount, estimate from the payment amount
         if coin_amount == 0:
             coin_amount = estimate_coin_amount(amount_crypto)
-            logger.info(f"Using estimated coin_amount: {coin_amount}")
+            logger.info("Using estimated coin_amount: %s", coin_amount)
         
-        # Update user balance using our SQLAlchemy method from database.methods
-        update_success, old_balance, new_balance = update_user_balance(user_id, coin_amount)
+        # Store the payment before acknowledging it, a failure here makes CryptoCloud retry
+        payment_id = await add_pending_payment(user_id, coin_amount, amount_crypto, currency)
+        if payment_id is None:
+            return json_response({'status': 'error', 'message': 'Failed to store payment'}, status=500)
         
-        if update_success:
-            logger.info(f"Successfully credited {coin_amount} coins to user {user_id}")
-            
-            # Send notification to user
-            notification_message = (
-                f"✅ <b>Payment Successful!</b>\n\n"
-                f"Your payment of {amount_crypto} {currency} has been received.\n"
-                f"{coin_amount} coins have been added to your balance.\n\n"
-                f"Old balance: {old_balance} coins\n"
-                f"New balance: {new_balance} coins\n\n"
-                f"Thank you for your purchase!"
-            )
-            
-            notification_sent = send_telegram_notification(user_id, notification_message)
-            logger.info(f"Notification sent: {notification_sent}")
-            
-            return jsonify({'status': 'success', 'message': 'Payment processed'}), 200
-        else:
-            logger.error(f"Failed to update balance for user {user_id}")
-            return jsonify({'status': 'error', 'message': 'Database update failed'}), 500
+        # Acknowledge right away so CryptoCloud doesn't retry, the workers do the rest
+        queue_payment(payment_id, user_id, coin_amount, amount_crypto, currency)
+        logger.info("Queued payment %s of %s coins for user %s", payment_id, coin_amount, user_id)
+        return json_response({'status': 'success', 'message': 'Payment accepted'})
                 
     except Exception as e:
-        logger.error(f"Unhandled error processing webhook: {e}")
-        return jsonify({'status': 'error', 'message': f'Internal server error: {str(e)}'}), 500
+        logger.error("Unhandled error processing webhook: %s", e)
+        return json_response({'status': 'error', 'message': f'Internal server error: {str(e)}'}, status=500)
 
-@app.route('/webhook/test', methods=['GET'])
-def test_endpoint():
+async def process_payment(payment_id, user_id, coin_amount, amount_crypto, currency):
+    """Credit a stored payment and notify the user about it, returns success"""
+    # The balance update and the removal of the stored payment share one transaction
+    update_success, old_balance, new_balance = await credit_pending_payment(payment_id, user_id, coin_amount)
+    
+    # Another worker or an earlier attempt already credited it, nothing left to do
+    if update_success is None:
+        return True
+    
+    if not update_success:
+        logger.error("Failed to update balance for user %s", user_id)
+        return False
+    
+    logger.info("Successfully credited %s coins to user %s", coin_amount, user_id)
+    
+    # Send notification to user
+    notification_message = PAYMENT_NOTIFICATION_TEMPLATE % (
+        amount_crypto, currency, coin_amount, old_balance, new_balance
+    )
+    
+    queue_notification(user_id, notification_message)
+    return True
+
+def queue_payment(payment_id, user_id, coin_amount, amount_crypto, currency):
+    """Hand a stored payment to the workers unless it is already queued"""
+    if payment_id in queued_payments:
+        return
+    queued_payments.add(payment_id)
+    payment_queue.put_nowait((payment_id, user_id, coin_amount, amount_crypto, currency))
+
+async def payment_failed(payment_id, user_id, coin_amount):
+    """Count a failed credit and alert the admins once the payment runs out of attempts"""
+    attempts = await mark_pending_payment_failed(payment_id)
+    if attempts is None or attempts < MAX_PAYMENT_ATTEMPTS:
+        return
+    
+    logger.error("Giving up on pending payment %s of %s coins for user %s after %s attempts",
+                 payment_id, coin_amount, user_id, attempts)
+    message = (
+        f"⚠️ <b>Payment not credited</b>\n\n"
+        f"Pending payment #{payment_id} of {coin_amount} coins for user {user_id} "
+        f"failed {attempts} times and needs to be credited manually."
+    )
+    for admin_id in ADMIN_IDS:
+        await send_telegram_notification(admin_id, message)
+
+async def payment_worker():
+    """Process queued payments one at a time until cancelled"""
+    while True:
+        job = await payment_queue.get()
+        payment_id, user_id, coin_amount = job[:3]
+        try:
+            credited = await process_payment(*job)
+        except Exception as e:
+            logger.error("Unhandled error processing payment %s: %s", job, e)
+            credited = False
+        
+        try:
+            # The stored payment stays in place and is picked up by the next re-scan
+            if not credited:
+                await payment_failed(payment_id, user_id, coin_amount)
+        except Exception as e:
+            logger.error("Error recording failed payment %s: %s", payment_id, e)
+        finally:
+            queued_payments.discard(payment_id)
+            payment_queue.task_done()
+
+async def requeue_pending_payments():
+    """Put stored payments that are not being processed back on the queue"""
+    for payment in await get_pending_payments(MAX_PAYMENT_ATTEMPTS):
+        if payment.id in queued_payments:
+            continue
+        logger.info("Retrying pending payment %s for user %s", payment.id, payment.telegram_id)
+        queue_payment(payment.id, payment.telegram_id, payment.coin_amount, payment.amount_crypto, payment.currency)
+
+async def retry_pending_payments():
+    """Re-scan stored payments every PENDING_RETRY_INTERVAL seconds until cancelled"""
+    while True:
+        await asyncio.sleep(PENDING_RETRY_INTERVAL)
+        try:
+            await requeue_pending_payments()
+        except Exception as e:
+            logger.error("Error retrying pending payments: %s", e)
+
+async def test_endpoint(request):
     """Test endpoint to verify the webhook server is running"""
-    return jsonify({
+    return json_response({
         'status': 'success',
         'message': 'Webhook server is running',
         'time': datetime.now().isoformat()
     })
 
+async def on_startup(app):
+    """Open the shared HTTP session, start the payment workers and retry pending payments"""
+    global http_session, payment_queue, retry_task
+    await init_db()
+    # Keep connections to api.telegram.org alive and its DNS answer cached between notifications
+    http_session = ClientSession(
+        connector=TCPConnector(limit=50, keepalive_timeout=75, ttl_dns_cache=300),
+        timeout=ClientTimeout(total=5),
+        json_serialize=lambda obj: orjson.dumps(obj).decode()
+    )
+    payment_queue = asyncio.Queue()
+    payment_workers.extend(asyncio.create_task(payment_worker()) for _ in range(PAYMENT_WORKERS))
+    await requeue_pending_payments()
+    retry_task = asyncio.create_task(retry_pending_payments())
+
+async def on_cleanup(app):
+    """Finish queued payments and notifications, then close the HTTP session"""
+    retry_task.cancel()
+    await asyncio.gather(retry_task, return_exceptions=True)
+    await payment_queue.join()
+    for task in payment_workers:
+        task.cancel()
+    await asyncio.gather(*payment_workers, return_exceptions=True)
+    payment_workers.clear()
+    await asyncio.gather(*notification_tasks, return_exceptions=True)
+    await http_session.close()
+
+def create_app():
+    """Build the webhook application"""
+    app = web.Application()
+    app.router.add_post('/payment/webhook', handle_webhook)
+    app.router.add_get('/webhook/test', test_endpoint)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
 if __name__ == '__main__':
-    # Start the Flask app
+    # Run on uvloop where it is available, it doesn't support Windows
+    loop = None
+    if sys.platform != 'win32':
+        import uvloop
+        loop = uvloop.new_event_loop()
+    
+    # Start the aiohttp app
     port = int(os.getenv('WEBHOOK_PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
\ No newline at end of file
+    web.run_app(create_app(), host='0.0.0.0', port=port, loop=loop)
\ No newline at end of file
@@ -2,7 +2,7 @@ from config import load_config
 
 # Load config to get admin IDs
 config = load_config()
-ADMIN_IDS = config.admin_ids
+ADMIN_IDS = frozenset(config.admin_ids)
 
 async def is_admin(user_id: int) -> bool:
     """